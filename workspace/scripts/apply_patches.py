@@ -0,0 +1,106 @@
+import sys
+import argparse
+import logging
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from arrange_images import load_json_file, read_image_as_rgba, composite_onto_underlay, union_bounding_boxes, save_image
+
+
+logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def load_sparse_patches(patch_info_path: Path):
+    """
+    arrange_images.py --sparse で出力された位置情報のJSONファイルと、アトラス画像を読み込む
+    """
+    patch_info = load_json_file(patch_info_path)
+    atlas_path = patch_info_path.parent / patch_info["atlas"]
+
+    if not atlas_path.exists():
+        raise FileNotFoundError(f"アトラス画像が見つかりません： {atlas_path}")
+
+    atlas = cv2.imread(atlas_path.as_posix(), cv2.IMREAD_UNCHANGED)
+    if atlas is None:
+        raise IOError(f"画像の読み込みに失敗しました： {atlas_path}")
+
+    return patch_info, atlas
+
+def expand_patches(patch_info, atlas):
+    """
+    アトラス画像のパッチを元のキャンバス上の位置に配置する
+    戻り値は (キャンバス画像, パッチ全体の外接矩形)
+    """
+    canvas_size = (int(patch_info["canvas"]["width"]), int(patch_info["canvas"]["height"]))
+    canvas = np.zeros((canvas_size[1], canvas_size[0]) + atlas.shape[2:], dtype=atlas.dtype)
+
+    dirty_rect = None
+    for patch in patch_info["patches"].values():
+        ax, ay = patch["atlas"]
+        x0, y0 = patch["offset"]
+        w, h = patch["size"]
+        canvas[y0:y0 + h, x0:x0 + w] = atlas[ay:ay + h, ax:ax + w]
+        dirty_rect = union_bounding_boxes(dirty_rect, (x0, y0, x0 + w, y0 + h))
+
+    return canvas, dirty_rect
+
+def apply_patches(patch_info, atlas, underlay_image=None):
+    """
+    パッチを下に敷く画像の上に合成する
+    下に敷く画像がない場合は、元のキャンバス全体の画像を復元して返す
+    """
+    canvas, dirty_rect = expand_patches(patch_info, atlas)
+
+    if underlay_image is None:
+        return canvas
+
+    if len(atlas.shape) != 3 or atlas.shape[2] != 4:
+        raise ValueError("アルファチャンネルを持たないパッチ（マスク画像など）は合成できません")
+
+    # パッチのある範囲だけを下に敷く画像の解像度で合成する
+    return composite_onto_underlay(underlay_image, canvas, dirty_rect)
+
+def determine_output_path(patch_info_path: Path, underlay_image_path: Path | None, output_arg: Path | None):
+    """
+    出力パスを決定する。
+    出力パスが指定されていない場合は、JSONファイルと同じフォルダに
+    下に敷く画像がある場合は <下に敷く画像名>_with_<パッチ名>.png、ない場合は <パッチ名>.png として出力する
+    """
+    if output_arg is not None:
+        output_arg.parent.mkdir(parents=True, exist_ok=True)
+        return output_arg
+
+    patch_name = patch_info_path.stem.removesuffix("_patches")
+    if underlay_image_path is not None:
+        return patch_info_path.parent / f"{underlay_image_path.stem}_with_{patch_name}.png"
+    return patch_info_path.parent / f"{patch_name}.png"
+
+def main():
+    parser = argparse.ArgumentParser(description='arrange_images.py --sparse で出力されたパッチを、下に敷く画像の上に合成するスクリプトです。')
+
+    parser.add_argument('patch_info', help='パッチの位置情報のJSONファイル（<名前>_patches.json）')
+    parser.add_argument('-u', '--underlay-image', help='パッチの下に重ねる画像。省略した場合はキャンバス全体の透過画像を復元します。')
+    parser.add_argument('-o', '--output-path', help='出力ファイルのパス')
+
+    args = parser.parse_args()
+
+    patch_info_path = Path(args.patch_info)
+    underlay_image_path = Path(args.underlay_image) if args.underlay_image else None
+    output_arg = Path(args.output_path) if args.output_path else None
+
+    try:
+        patch_info, atlas = load_sparse_patches(patch_info_path)
+        underlay_image = read_image_as_rgba(underlay_image_path) if underlay_image_path else None
+        output_image = apply_patches(patch_info, atlas, underlay_image)
+    except Exception as e:
+        logger.critical(f"パッチの合成に失敗しました: {e}")
+        sys.exit(1)
+
+    output_path = determine_output_path(patch_info_path, underlay_image_path, output_arg)
+    save_image(output_image, output_path)
+
+if __name__ == '__main__':
+    main()
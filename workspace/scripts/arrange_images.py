@@ -1,14 +1,24 @@
+import os
+import re
 import json
+import glob
+import time
 import argparse
 import logging
 from pathlib import Path
 from datetime import datetime
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 import cv2
 import numpy as np
 
 
 DEFAULT_OUTPUT_FOLDER = Path(__file__).parent.parent / "outputs"  # デフォルトの出力先フォルダ
+RENDER_INFO_FILE_NAME = "annotations_used.json"  # 出力に使用したアノテーションの保存先ファイル名
+DEFAULT_PREVIEW_SCALE = 0.25  # プレビューの縮小率
+PREVIEW_BACKGROUND_COLOR = (64, 64, 64, 255)  # プレビューの透明部分の背景色
+SEQUENCE_IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff", ".webp")  # フォルダから連番画像として読み込む拡張子
 
 logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
 logger = logging.getLogger(__name__)
@@ -55,6 +65,43 @@ def read_image_as_rgba(image_path):
 
     return image
 
+def read_image_as_rgba_reduced(image_path, scale):
+    """
+    画像を縮小してRGBAで読み込む（プレビュー用）
+    JPEGはデコード時に縮小できるため、可能な範囲で縮小デコードしてから指定の縮小率に合わせる
+    """
+    if image_path is None:
+        return None
+
+    image_path = Path(image_path)
+
+    if not image_path.exists():
+        raise FileNotFoundError(f"ファイルが見つかりません： {image_path}")
+
+    flag, reduction = cv2.IMREAD_UNCHANGED, 1
+    if image_path.suffix.lower() in (".jpg", ".jpeg"):
+        # JPEGはアルファチャンネルを持たないため、縮小デコードしても情報は失われない
+        for reduction, flag in ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2), (1, cv2.IMREAD_COLOR)):
+            if scale * reduction <= 1:
+                break
+
+    image = cv2.imread(image_path.as_posix(), flag)
+
+    if image is None:
+        raise IOError(f"画像の読み込みに失敗しました： {[image_path]}")
+
+    if len(image.shape) == 2:
+        image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+    if image.shape[2] == 3:
+        alpha = np.ones((image.shape[0], image.shape[1]), dtype=np.uint8) * 255
+        image = cv2.merge([image, alpha])
+
+    reduced_size = (max(int(round(image.shape[1] * reduction * scale)), 1), max(int(round(image.shape[0] * reduction * scale)), 1))
+    if (image.shape[1], image.shape[0]) != reduced_size:
+        image = cv2.resize(image, reduced_size, interpolation=cv2.INTER_AREA)
+
+    return image
+
 def convert_mask_to_grayscale(mask: np.ndarray) -> np.ndarray:
     """
     マスク画像をグレースケール化する。
@@ -114,30 +161,88 @@ def apply_mask(image: np.ndarray, mask: np.ndarray) -> np.ndarray:
     else:
         raise ValueError("Unsupported number of channels in image")
 
-def create_small_image_overlay(small_img, large_img_size, region):
+def get_region_bounding_box(region, canvas_size):
     """
-    小さな画像を大きな画像の指定箇所に回転を考慮して配置する
-    透明な大きい画像を用意し、そこに配置してから回転する
-    余計な部分も回転していて計算量が無駄に多そうな気持ちはある
+    回転を考慮した領域の外接矩形 (x0, y0, x1, y1) をキャンバス内に収めて返す
+    貼り付け位置の整数化と補間で滲む分として2pxの余白を含める
     """
     center = region["center"]
     size = region["size"]
-    angle = region["angle"]
+    angle = np.radians(region["angle"])
+
+    cos_a, sin_a = abs(np.cos(angle)), abs(np.sin(angle))
+    half_w = (size[0] * cos_a + size[1] * sin_a) / 2
+    half_h = (size[0] * sin_a + size[1] * cos_a) / 2
+
+    x0 = max(int(np.floor(center[0] - half_w)) - 2, 0)
+    y0 = max(int(np.floor(center[1] - half_h)) - 2, 0)
+    x1 = min(int(np.ceil(center[0] + half_w)) + 2, canvas_size[0])
+    y1 = min(int(np.ceil(center[1] + half_h)) + 2, canvas_size[1])
+
+    return (x0, y0, x1, y1)
 
-    offset = (int(center[0] - size[0] / 2), int(center[1] - size[1] / 2))
-    size =(int(size[0]), int(size[1]))
-    center = tuple(center)
+def union_bounding_boxes(box1, box2):
+    if box1 is None:
+        return box2
+    if box2 is None:
+        return box1
+    return (min(box1[0], box2[0]), min(box1[1], box2[1]), max(box1[2], box2[2]), max(box1[3], box2[3]))
 
-    # 透明な画像を作成
-    large_img = np.zeros((large_img_size[0], large_img_size[1], 4), dtype=np.uint8)
+def rects_intersect(rect1, rect2):
+    return rect1[0] < rect2[2] and rect2[0] < rect1[2] and rect1[1] < rect2[3] and rect2[1] < rect1[3]
 
-    resized_small_img = cv2.resize(small_img, size)
-    large_img[offset[1]:offset[1]+size[1], offset[0]:offset[0]+size[0], :4] = resized_small_img
-    rotation_matrix = cv2.getRotationMatrix2D(center, angle, 1)
+def map_rect_to_underlay(rect, overlay_size, underlay_size):
+    """
+    overlay_image上の矩形を、合成時に影響を受けるunderlay_image上の矩形に変換する
+    拡大時は端の画素が補間で外側に滲むため、overlay_imageの1px分広げる
+    """
+    scale_x = underlay_size[0] / overlay_size[0]
+    scale_y = underlay_size[1] / overlay_size[1]
+
+    x0, y0, x1, y1 = rect
+    ux0 = max(int(np.floor((x0 - 1) * scale_x)), 0)
+    uy0 = max(int(np.floor((y0 - 1) * scale_y)), 0)
+    ux1 = min(int(np.ceil((x1 + 1) * scale_x)), underlay_size[0])
+    uy1 = min(int(np.ceil((y1 + 1) * scale_y)), underlay_size[1])
 
-    rotated_img = cv2.warpAffine(large_img, rotation_matrix, (large_img.shape[1], large_img.shape[0]))
+    return (ux0, uy0, ux1, uy1)
 
-    return rotated_img
+def composite_onto_underlay(underlay_image, overlay_image, dirty_rect):
+    """
+    overlay_imageをunderlay_imageの上にアルファブレンドで合成する
+    貼り付けられた領域(dirty_rect)に対応する範囲だけを、underlay_imageの解像度で処理する
+    overlay_image全体のリサイズは行わない
+    """
+    if dirty_rect is None:
+        return underlay_image
+
+    overlay_height, overlay_width = overlay_image.shape[:2]
+    underlay_height, underlay_width = underlay_image.shape[:2]
+    scale_x = underlay_width / overlay_width
+    scale_y = underlay_height / overlay_height
+
+    ux0, uy0, ux1, uy1 = map_rect_to_underlay(dirty_rect, (overlay_width, overlay_height), (underlay_width, underlay_height))
+    if ux1 <= ux0 or uy1 <= uy0:
+        return underlay_image
+
+    if scale_x == 1 and scale_y == 1:
+        overlay_roi = overlay_image[uy0:uy1, ux0:ux1]
+    else:
+        # cv2.resizeと同じ画素中心の対応で、範囲内だけをサンプリングする
+        matrix = np.array([
+            [1 / scale_x, 0, (ux0 + 0.5) / scale_x - 0.5],
+            [0, 1 / scale_y, (uy0 + 0.5) / scale_y - 0.5]
+        ])
+        overlay_roi = cv2.warpAffine(
+            overlay_image, matrix, (ux1 - ux0, uy1 - uy0),
+            flags=cv2.INTER_LINEAR | cv2.WARP_INVERSE_MAP, borderMode=cv2.BORDER_REPLICATE
+        )
+
+    underlay_roi = underlay_image[uy0:uy1, ux0:ux1]
+    alpha = overlay_roi[:, :, 3:4] / 255.0
+    underlay_roi[:, :, :4] = underlay_roi[:, :, :4] * (1 - alpha) + overlay_roi * alpha
+
+    return underlay_image
 
 def convert_relative_to_absolute(annotation, canvas_size):
     coordinate_system = annotation['canvas']['coordinate_system']
@@ -177,25 +282,125 @@ def convert_relative_to_absolute(annotation, canvas_size):
     
     return annotation_abs
 
-def crop_and_rearrange(input_image: np.ndarray, annotation1: dict, annotation2: dict, underlay_image=None, pre_crop_mask=None, post_paste_mask=None, creates_mask=False):
-     # 入力と出力の画像サイズ
-    input_size = (input_image.shape[1], input_image.shape[0])
-    output_size = (int(annotation2["canvas"]["width"]), int(annotation2["canvas"]["height"]))   
+def scale_annotation(annotation, scale_x, scale_y):
+    """
+    アノテーションのキャンバスサイズを拡大縮小する
+    絶対座標の場合は、各領域の位置とサイズも同じ比率で拡大縮小する
+    """
+    annotation_scaled = {
+        'canvas': annotation['canvas'].copy(),
+        'regions': {}
+    }
+    annotation_scaled['canvas']['width'] = annotation['canvas']['width'] * scale_x
+    annotation_scaled['canvas']['height'] = annotation['canvas']['height'] * scale_y
 
-    if pre_crop_mask is not None:
-        input_image = apply_mask(input_image, pre_crop_mask)
+    for region_name, region_data in annotation['regions'].items():
+        region_scaled = region_data.copy()
+        if annotation['canvas']['coordinate_system'] == "absolute":
+            region_scaled['center'] = [region_data['center'][0] * scale_x, region_data['center'][1] * scale_y]
+            region_scaled['size'] = [region_data['size'][0] * scale_x, region_data['size'][1] * scale_y]
+        annotation_scaled['regions'][region_name] = region_scaled
+
+    return annotation_scaled
+
+def compile_paste_geometry(region2, output_size):
+    """
+    貼り付け先の領域について、拡大縮小後のサイズ、回転して配置するための変換、外接矩形を計算する
+    貼り付け先がキャンバスの外にある場合はNoneを返す
+    """
+    # 貼り付け先の矩形の位置に置いてから中心で回転し、外接矩形の左上が原点になるよう平行移動する
+    center = tuple(region2["center"])
+    paste_size = (int(region2["size"][0]), int(region2["size"][1]))
+    paste_offset = (int(center[0] - region2["size"][0] / 2), int(center[1] - region2["size"][1] / 2))
+
+    dest_rect = get_region_bounding_box(region2, output_size)
+    if dest_rect[2] <= dest_rect[0] or dest_rect[3] <= dest_rect[1]:
+        return None
+
+    paste_matrix = cv2.getRotationMatrix2D(center, region2["angle"], 1)
+    paste_matrix[:, 2] += paste_matrix[:, :2] @ paste_offset - np.array(dest_rect[:2])
+
+    return {
+        "paste_size": paste_size,
+        "paste_matrix": paste_matrix,
+        "dest_rect": dest_rect
+    }
+
+def rasterize_region_mask(mask_image: np.ndarray, region, antialias=True):
+    """
+    貼り付け先の回転した矩形を、1チャンネルのマスク画像に直接描画する
+    描画は貼り付け先の外接矩形の中だけで行う
+
+    外接矩形内の各画素の中心を貼り付ける画像の座標に戻し、矩形の内側かどうかを計算する
+    アンチエイリアスありの場合は、矩形の辺をまたぐ1px幅で濃度を変化させる（白い画像を線形補間で変換した場合と同じ）
+    """
+    x0, y0, x1, y1 = region["dest_rect"]
+    w, h = region["paste_size"]
+
+    inverse_matrix = cv2.invertAffineTransform(region["paste_matrix"])
+    xs = np.arange(x1 - x0, dtype=np.float32)[np.newaxis, :]
+    ys = np.arange(y1 - y0, dtype=np.float32)[:, np.newaxis]
+    u = inverse_matrix[0, 0] * xs + inverse_matrix[0, 1] * ys + inverse_matrix[0, 2]
+    v = inverse_matrix[1, 0] * xs + inverse_matrix[1, 1] * ys + inverse_matrix[1, 2]
+
+    if antialias:
+        coverage_u = np.clip(np.minimum(u + 1, w - u), 0, 1)
+        coverage_v = np.clip(np.minimum(v + 1, h - v), 0, 1)
+        region_mask = np.round(coverage_u * coverage_v * 255).astype(np.uint8)
+    else:
+        region_mask = ((u >= -0.5) & (u < w - 0.5) & (v >= -0.5) & (v < h - 0.5)).astype(np.uint8) * 255
+
+    mask_roi = mask_image[y0:y1, x0:x1]
+    np.maximum(mask_roi, region_mask, out=mask_roi)
+
+def create_annotation_mask(annotation2: dict, antialias=True):
+    """
+    入力画像を使わずに、アノテーションだけから貼り付け先の全ての領域のマスク画像を作成する
+    """
+    output_size = (int(annotation2["canvas"]["width"]), int(annotation2["canvas"]["height"]))
+    annotation2_abs = convert_relative_to_absolute(annotation2, output_size)
+
+    mask_image = np.zeros((output_size[1], output_size[0]), dtype=np.uint8)
+    for region_name, region2 in annotation2_abs["regions"].items():
+        region = compile_paste_geometry(region2, output_size)
+        if region is None:
+            logger.warning(f"貼り付け先がキャンバスの外にあるためスキップします: {region_name} ")
+            continue
+        rasterize_region_mask(mask_image, region, antialias)
+
+    return mask_image
+
+def compile_region_geometry(annotation1: dict, annotation2: dict, input_size, region_names=None):
+    """
+    アノテーションから、領域ごとの切り取り・貼り付けの変換を事前に計算する
+    入力画像の内容には依存しないため、同じサイズの入力画像であれば使い回せる
+
+    各領域について以下を持つ
+    - crop_matrix: 入力画像から回転を戻して切り取るための変換
+    - crop_size: 切り取る画像のサイズ
+    - paste_size: 貼り付け前に拡大縮小するサイズ
+    - paste_matrix: 拡大縮小した画像を、貼り付け先の外接矩形(dest_rect)内に回転して配置するための変換
+    """
+    output_size = (int(annotation2["canvas"]["width"]), int(annotation2["canvas"]["height"]))
 
     # 相対座標を絶対座標に変換
     annotation1_abs = convert_relative_to_absolute(annotation1, input_size)
     annotation2_abs = convert_relative_to_absolute(annotation2, output_size)
 
-    # 出力画像と出力マスク画像を準備
-    output_image = np.zeros((output_size[1], output_size[0], 4), dtype=np.uint8)
-    if creates_mask: output_mask_image = np.zeros((output_size[1], output_size[0], 4), dtype=np.uint8)  # 黒（0）のマスク画像
+    geometry = {
+        "input_size": tuple(input_size),
+        "output_size": output_size,
+        "regions": {},
+        "dirty_rect": None  # 貼り付けた領域全体の外接矩形
+    }
 
     # annotation2の領域ごとに処理
     for region_name, region2 in annotation2_abs["regions"].items():
 
+        # region_namesが指定されている場合、それ以外の領域は処理しない
+        if region_names is not None and region_name not in region_names:
+            continue
+
         # annotation1から同名の領域を取得
         if region_name in annotation1_abs["regions"]:
             region1 = annotation1_abs["regions"][region_name]
@@ -203,42 +408,82 @@ def crop_and_rearrange(input_image: np.ndarray, annotation1: dict, annotation2:
             logger.warning(f"領域がannotation1に見つからないためスキップします: {region_name} ")
             continue
 
-        # annotationのregion情報から領域を指定
+        # ステップ1: 切り抜き
+        # 切り取り元の中心で回転を戻し、切り取る矩形の左上が原点になるよう平行移動する
         src_rect_center = (int(region1['center'][0]), int(region1['center'][1]))
         src_rect_size = (int(region1['size'][0]), int(region1['size'][1]))
-        angle = region1['angle']
 
-        # todo: 回転ではみ出る可能性があるので、"回転+中央に移動"にする
+        crop_x = int(src_rect_center[0] - src_rect_size[0] / 2)
+        crop_y = int(src_rect_center[1] - src_rect_size[1] / 2)
 
-        # ステップ1: 切り抜き
-        # Extract rotated region from the source image (region1)
-        rotation_matrix = cv2.getRotationMatrix2D(src_rect_center, angle, 1)
-        rotated_region = cv2.warpAffine(input_image, rotation_matrix, input_size)
+        crop_matrix = cv2.getRotationMatrix2D(src_rect_center, region1['angle'], 1)
+        crop_matrix[:, 2] -= (crop_x, crop_y)
 
-        # Calculate the bounding box of the rotated region
-        rotated_x = int(src_rect_center[0] - src_rect_size[0] / 2)
-        rotated_y = int(src_rect_center[1] - src_rect_size[1] / 2)
-        rotated_w = int(src_rect_size[0]) 
-        rotated_h = int(src_rect_size[1])
+        # ステップ2: 貼り付け
+        paste_geometry = compile_paste_geometry(region2, output_size)
+        if paste_geometry is None:
+            logger.warning(f"貼り付け先がキャンバスの外にあるためスキップします: {region_name} ")
+            continue
 
-        # Crop the rotated region
-        cropped_image = rotated_region[rotated_y:rotated_y + rotated_h, rotated_x:rotated_x + rotated_w]
+        geometry["regions"][region_name] = {
+            "crop_matrix": crop_matrix,
+            "crop_size": src_rect_size,
+            **paste_geometry
+        }
+        geometry["dirty_rect"] = union_bounding_boxes(geometry["dirty_rect"], paste_geometry["dest_rect"])
 
-        # ステップ2: 貼り付け
-        small_image_overlay = create_small_image_overlay(cropped_image, output_size, region2)
+    return geometry
+
+def arrange_regions(input_images, geometry: dict, creates_mask=False):
+    """
+    同じサイズの複数の画像（同じUV配置のテクスチャセット）を、領域ごとにまとめて切り取り・再配置する
+    領域ごとの貼り付け結果をテクスチャの数だけ重ねて、1回のアルファブレンドで合成する
+    マスク画像はテクスチャに依存しないため、領域ごとに1回だけ作成する
+
+    戻り値は (テクスチャごとの出力画像のリスト, 出力マスク画像またはNone)
+    """
+    output_size = geometry["output_size"]
+
+    for input_image in input_images:
+        input_size = (input_image.shape[1], input_image.shape[0])
+        if input_size != geometry["input_size"]:
+            raise ValueError(f"入力画像のサイズがアノテーションの計算時と異なります： {input_size} != {geometry['input_size']}")
+
+    # 出力画像と出力マスク画像を準備
+    # 出力画像は (テクスチャ, 高さ, 幅, チャンネル) の順に重ねる
+    output_stack = np.zeros((len(input_images), output_size[1], output_size[0], 4), dtype=np.uint8)
+    output_mask_image = np.zeros((output_size[1], output_size[0]), dtype=np.uint8) if creates_mask else None  # 黒（0）のマスク画像
 
-        # 大きな画像と回転後の透明な画像をアルファブレンドで合成
-        for c in range(0, 4):
-            output_image[:, :, c] = output_image[:, :, c] * (1 - small_image_overlay[:, :, 3] / 255.0) + small_image_overlay[:, :, c] * (small_image_overlay[:, :, 3] / 255.0)
+    for region in geometry["regions"].values():
+        x0, y0, x1, y1 = region["dest_rect"]
+        dest_size = (x1 - x0, y1 - y0)
+
+        # OpenCVは5チャンネル以上の画像の変換が遅いため、変換はテクスチャごとに行う
+        overlay_stack = np.empty((len(input_images), dest_size[1], dest_size[0], 4), dtype=np.uint8)
+        for i, input_image in enumerate(input_images):
+            # ステップ1: 切り抜き
+            cropped_image = cv2.warpAffine(input_image, region["crop_matrix"], region["crop_size"])
+
+            # ステップ2: 貼り付け
+            resized_image = cv2.resize(cropped_image, region["paste_size"])
+            overlay_stack[i] = cv2.warpAffine(resized_image, region["paste_matrix"], dest_size)
+
+        # 貼り付け先の範囲だけを、全てのテクスチャまとめてアルファブレンドで合成
+        output_roi = output_stack[:, y0:y1, x0:x1]
+        alpha = overlay_stack[:, :, :, 3:4] / 255.0
+        output_roi[...] = output_roi * (1 - alpha) + overlay_stack * alpha
 
         # マスク画像の作成
-        # マスク用に、真っ白なcropped_imgを作る
+        # 貼り付け先の回転した矩形を直接描画する
         if creates_mask:
-          white_cropped_image = np.ones((cropped_image.shape[0], cropped_image.shape[1], 4), dtype=np.uint8) * 255
-          small_mask_image_overlay = create_small_image_overlay(white_cropped_image, output_size, region2)
+            rasterize_region_mask(output_mask_image, region)
 
-          output_mask_image = np.maximum(output_mask_image, small_mask_image_overlay)
+    return list(output_stack), output_mask_image
 
+def finish_output_images(output_image: np.ndarray, geometry: dict, underlay_image=None, post_paste_mask=None, output_mask_image=None):
+    """
+    再配置した画像に貼り付け後のマスクを適用し、マスク画像と下に敷く画像との合成画像をまとめて返す
+    """
     # 出力画像が透明な場合、エラーを出す
     if np.sum(output_image) == 0:
         raise ValueError("Output mask image is completely blank. No regions were processed.")
@@ -248,26 +493,261 @@ def crop_and_rearrange(input_image: np.ndarray, annotation1: dict, annotation2:
 
     output_images = {}
     output_images["output"] = output_image
-    if creates_mask:
-        if output_mask_image is not None: 
-            output_mask_image = convert_mask_to_grayscale(output_mask_image)
-            output_images["mask"] = output_mask_image
+    if output_mask_image is not None:
+        output_images["mask"] = output_mask_image
 
     # underlay_imageが存在する場合、その上に合成
+    # 貼り付けた領域の範囲だけをunderlay_imageの解像度で合成する
     if underlay_image is not None:
-        underlay_height, underlay_width = underlay_image.shape[:2]
+        output_images["composite"] = composite_onto_underlay(underlay_image, output_image, geometry["dirty_rect"])
+    
+    return output_images
 
-        if underlay_width != output_size[0] or underlay_height != output_size[1]:
-            # サイズを調整する
-            output_image = cv2.resize(output_image, (underlay_width, underlay_height))
+def rearrange_with_geometry(input_image: np.ndarray, geometry: dict, underlay_image=None, pre_crop_mask=None, post_paste_mask=None, creates_mask=False):
+    """
+    compile_region_geometryで計算した変換を使って切り取り・再配置を行う
+    変換は各領域の切り取り範囲と貼り付け先の外接矩形の中だけで行う
+    """
+    if pre_crop_mask is not None:
+        input_image = apply_mask(input_image, pre_crop_mask)
 
-        # 出力画像とoverlay画像を合成
-        for c in range(0, 4):
-            underlay_image[:, :, c] = underlay_image[:, :, c] * (1 - output_image[:, :, 3] / 255.0) + output_image[:, :, c] * (output_image[:, :, 3] / 255.0)
+    output_images, output_mask_image = arrange_regions([input_image], geometry, creates_mask)
 
-        output_images["composite"] = underlay_image
-    
-    return output_images
+    return finish_output_images(output_images[0], geometry, underlay_image, post_paste_mask, output_mask_image)
+
+def arrange_texture_sets(input_images, annotation1: dict, annotation2: dict, pre_crop_mask=None, creates_mask=False):
+    """
+    入力画像をサイズごとにまとめ、同じサイズの画像は領域ごとの変換を共有して一度に再配置する
+    戻り値は ({入力画像の番号: (出力画像, 変換)}, 出力マスク画像またはNone)
+    """
+    texture_sets = {}
+    for i, input_image in enumerate(input_images):
+        if input_image is None:
+            continue
+        texture_sets.setdefault((input_image.shape[1], input_image.shape[0]), []).append(i)
+
+    arranged_images = {}
+    output_mask_image = None
+    for input_size, indices in texture_sets.items():
+        geometry = compile_region_geometry(annotation1, annotation2, input_size)
+
+        images = [input_images[i] for i in indices]
+        if pre_crop_mask is not None:
+            images = [apply_mask(image, pre_crop_mask) for image in images]
+
+        output_images, mask_image = arrange_regions(images, geometry, creates_mask and output_mask_image is None)
+        if mask_image is not None:
+            output_mask_image = mask_image
+
+        for i, output_image in zip(indices, output_images):
+            arranged_images[i] = (output_image, geometry)
+
+    return arranged_images, output_mask_image
+
+def get_patch_rects(geometry):
+    """
+    領域名ごとの貼り付け先の外接矩形を返す
+    """
+    return {region_name: region["dest_rect"] for region_name, region in geometry["regions"].items()}
+
+def crop_and_rearrange(input_image: np.ndarray, annotation1: dict, annotation2: dict, underlay_image=None, pre_crop_mask=None, post_paste_mask=None, creates_mask=False, region_names=None):
+    input_size = (input_image.shape[1], input_image.shape[0])
+    geometry = compile_region_geometry(annotation1, annotation2, input_size, region_names)
+
+    return rearrange_with_geometry(input_image, geometry, underlay_image, pre_crop_mask, post_paste_mask, creates_mask)
+
+def find_changed_regions(previous_annotation1, previous_annotation2, annotation1, annotation2):
+    """
+    前回の出力に使用したアノテーションと今回のアノテーションを比較し、変更された領域名の集合を返す
+    切り取り側・貼り付け側のどちらかが変更、追加、削除された領域を変更ありとする
+    """
+    region_names = set(previous_annotation2["regions"]) | set(annotation2["regions"])
+
+    changed = set()
+    for region_name in region_names:
+        if previous_annotation2["regions"].get(region_name) != annotation2["regions"].get(region_name):
+            changed.add(region_name)
+        elif previous_annotation1["regions"].get(region_name) != annotation1["regions"].get(region_name):
+            changed.add(region_name)
+
+    return changed
+
+def plan_incremental_render(previous_render_info, annotation1, annotation2):
+    """
+    前回の出力を部分的に描き直すための計画を立てる
+
+    戻り値は (描き直す領域名の集合, 消去して描き直す矩形のリスト)
+    キャンバスが変更されている場合など、部分的な描き直しができない場合はNoneを返す
+    """
+    previous_annotation1 = previous_render_info["annotation1"]
+    previous_annotation2 = previous_render_info["annotation2"]
+
+    if previous_annotation1["canvas"] != annotation1["canvas"] or previous_annotation2["canvas"] != annotation2["canvas"]:
+        logger.warning("キャンバスの設定が前回と異なるため、全ての領域を描き直します。")
+        return None
+
+    output_size = (int(annotation2["canvas"]["width"]), int(annotation2["canvas"]["height"]))
+    previous_annotation2_abs = convert_relative_to_absolute(previous_annotation2, output_size)
+    annotation2_abs = convert_relative_to_absolute(annotation2, output_size)
+
+    changed_regions = find_changed_regions(previous_annotation1, previous_annotation2, annotation1, annotation2)
+
+    # 変更された領域の、前回と今回の貼り付け先の矩形を消去対象にする
+    dirty_rects = []
+    for region_name in sorted(changed_regions):
+        if region_name in previous_annotation2_abs["regions"] and region_name in previous_annotation1["regions"]:
+            dirty_rects.append(get_region_bounding_box(previous_annotation2_abs["regions"][region_name], output_size))
+        if region_name in annotation2_abs["regions"] and region_name in annotation1["regions"]:
+            dirty_rects.append(get_region_bounding_box(annotation2_abs["regions"][region_name], output_size))
+
+    # 消去対象の矩形に重なる領域は、変更されていなくても描き直す必要がある
+    redraw_regions = set()
+    for region_name, region2 in annotation2_abs["regions"].items():
+        if region_name not in annotation1["regions"]:
+            continue
+        box = get_region_bounding_box(region2, output_size)
+        if any(rects_intersect(box, rect) for rect in dirty_rects):
+            redraw_regions.add(region_name)
+
+    logger.info(f"変更された領域: {sorted(changed_regions)}")
+    logger.info(f"描き直す領域: {sorted(redraw_regions)}")
+
+    return redraw_regions, dirty_rects
+
+def patch_output_images(previous_images, rendered_images, dirty_rects, underlay_image=None):
+    """
+    前回の出力画像のdirty_rectsの範囲を、描き直した画像で置き換える
+    合成画像は、範囲内をunderlay_imageで元に戻してから合成し直す
+    """
+    patched_images = {}
+
+    for type in ("output", "mask"):
+        if type not in previous_images or type not in rendered_images:
+            continue
+        image = previous_images[type]
+        for x0, y0, x1, y1 in dirty_rects:
+            image[y0:y1, x0:x1] = rendered_images[type][y0:y1, x0:x1]
+        patched_images[type] = image
+
+    if "composite" in previous_images and underlay_image is not None and "output" in patched_images:
+        output_image = patched_images["output"]
+        composite_image = previous_images["composite"]
+        overlay_size = (output_image.shape[1], output_image.shape[0])
+        underlay_size = (composite_image.shape[1], composite_image.shape[0])
+
+        for rect in dirty_rects:
+            ux0, uy0, ux1, uy1 = map_rect_to_underlay(rect, overlay_size, underlay_size)
+            composite_image[uy0:uy1, ux0:ux1] = underlay_image[uy0:uy1, ux0:ux1]
+            composite_onto_underlay(composite_image, output_image, rect)
+
+        patched_images["composite"] = composite_image
+
+    return patched_images
+
+def read_previous_output_images(previous_output_dir: Path, file_name, mask_name, composite_name):
+    """
+    前回の出力フォルダから出力画像、マスク画像、合成画像を読み込む
+    存在しない画像は含まれない
+    """
+    previous_images = {}
+    candidates = {"output": file_name, "mask": mask_name, "composite": composite_name}
+    for type, name in candidates.items():
+        if name is None:
+            continue
+        path = previous_output_dir / f"{name}.png"
+        if not path.exists():
+            continue
+        image = cv2.imread(path.as_posix(), cv2.IMREAD_UNCHANGED)
+        if image is None:
+            raise IOError(f"画像の読み込みに失敗しました： {path}")
+        previous_images[type] = image
+
+    return previous_images
+
+def rearrange_incrementally(previous_images, input_image, annotation1, annotation2, redraw_regions, dirty_rects, underlay_image=None, pre_crop_mask=None, post_paste_mask=None, creates_mask=False):
+    """
+    変更があった領域と、その周辺で重なる領域だけを描き直し、前回の出力画像に反映する
+    """
+    if redraw_regions:
+        rendered_images = crop_and_rearrange(
+            input_image, annotation1, annotation2,
+            None, pre_crop_mask, post_paste_mask, creates_mask, redraw_regions
+        )
+    else:
+        # 領域が削除されただけの場合は消去のみ行う
+        output_size = (int(annotation2["canvas"]["width"]), int(annotation2["canvas"]["height"]))
+        rendered_images = {"output": np.zeros((output_size[1], output_size[0], 4), dtype=np.uint8)}
+        if creates_mask:
+            rendered_images["mask"] = np.zeros((output_size[1], output_size[0]), dtype=np.uint8)
+
+    return patch_output_images(previous_images, rendered_images, dirty_rects, underlay_image)
+
+def save_render_info(output_dir: Path, annotation1, annotation2):
+    """
+    出力に使用したアノテーションを保存する。次回の部分的な描き直しで前回の状態として使用する
+    """
+    render_info = {
+        "annotation1": annotation1,
+        "annotation2": annotation2
+    }
+    with open(output_dir / RENDER_INFO_FILE_NAME, 'w', encoding='utf-8') as f:
+        json.dump(render_info, f, indent=2, ensure_ascii=False)
+
+def pack_patches(patch_sizes):
+    """
+    パッチを1枚のアトラス画像に棚詰め(shelf packing)で配置する
+    戻り値は ({パッチ名: アトラス上の左上座標}, アトラスのサイズ)
+    """
+    total_area = sum(w * h for w, h in patch_sizes.values())
+    max_width = max(w for w, _ in patch_sizes.values())
+    atlas_width = max(max_width, int(np.ceil(np.sqrt(total_area))))
+
+    positions = {}
+    x, y, shelf_height = 0, 0, 0
+    # 高さの大きい順に並べて、棚の隙間を減らす
+    for name in sorted(patch_sizes, key=lambda n: patch_sizes[n][1], reverse=True):
+        w, h = patch_sizes[name]
+        if x + w > atlas_width:
+            y += shelf_height
+            x, shelf_height = 0, 0
+        positions[name] = (x, y)
+        x += w
+        shelf_height = max(shelf_height, h)
+
+    return positions, (atlas_width, y + shelf_height)
+
+def save_sparse_patches(image, patch_rects, output_dir: Path, name):
+    """
+    キャンバス全体の代わりに、貼り付けた領域(patch_rects)だけを1枚のアトラス画像にまとめて保存する
+    各パッチのキャンバス上の位置とサイズはJSONファイルに保存する
+    """
+    patch_sizes = {region_name: (x1 - x0, y1 - y0) for region_name, (x0, y0, x1, y1) in patch_rects.items()}
+    positions, atlas_size = pack_patches(patch_sizes)
+
+    atlas = np.zeros((atlas_size[1], atlas_size[0]) + image.shape[2:], dtype=image.dtype)
+    patches = {}
+    for region_name, (x0, y0, x1, y1) in patch_rects.items():
+        ax, ay = positions[region_name]
+        atlas[ay:ay + y1 - y0, ax:ax + x1 - x0] = image[y0:y1, x0:x1]
+        patches[region_name] = {
+            "atlas": [ax, ay],
+            "offset": [x0, y0],
+            "size": [x1 - x0, y1 - y0]
+        }
+
+    atlas_name = f"{name}_patches"
+    patch_info = {
+        "canvas": {
+            "width": image.shape[1],
+            "height": image.shape[0]
+        },
+        "atlas": f"{atlas_name}.png",
+        "patches": patches
+    }
+
+    save_image(atlas, output_dir / f"{atlas_name}.png")
+    with open(output_dir / f"{atlas_name}.json", 'w', encoding='utf-8') as f:
+        json.dump(patch_info, f, indent=2, ensure_ascii=False)
 
 def create_output_directory(output_path: Path, annotation1_path: Path, annotation2_path: Path):
     """
@@ -309,7 +789,10 @@ def process_images_batch(
     width_override=None,
     height_override=None,
     pre_crop_mask_path=None,
-    post_paste_mask_path=None
+    post_paste_mask_path=None,
+    region_names=None,
+    previous_output_dir_path=None,
+    sparse=False
 ):
     input_image_paths = [Path(p) for p in input_image_paths]
     annotation1_path = Path(annotation1_path)
@@ -320,6 +803,12 @@ def process_images_batch(
     height_override = int(height_override) if height_override else None
     pre_crop_mask_path = Path(pre_crop_mask_path) if pre_crop_mask_path else None
     post_paste_mask_path = Path(post_paste_mask_path) if post_paste_mask_path else None
+    previous_output_dir_path = Path(previous_output_dir_path) if previous_output_dir_path else None
+
+    if region_names and previous_output_dir_path:
+        raise ValueError("regionsとincrementalは同時に指定できません。")
+    if sparse and previous_output_dir_path:
+        raise ValueError("sparseとincrementalは同時に指定できません。")
 
     input_images = []
     for path in input_image_paths:
@@ -341,6 +830,19 @@ def process_images_batch(
     if height_override:
         annotation2['canvas']['height'] = height_override
 
+    # 指定された領域のみを処理する
+    if region_names:
+        region_names = set(region_names)
+        for region_name in sorted(region_names - set(annotation2['regions'])):
+            logger.warning(f"指定された領域がannotation2に見つかりません: {region_name}")
+        annotation2['regions'] = {name: region for name, region in annotation2['regions'].items() if name in region_names}
+
+    # 前回の出力から部分的に描き直す
+    incremental_plan = None
+    if previous_output_dir_path:
+        previous_render_info = load_json_file(previous_output_dir_path / RENDER_INFO_FILE_NAME)
+        incremental_plan = plan_incremental_render(previous_render_info, annotation1, annotation2)
+
     # underlay path normalization
     if not underlay_image_paths:
         underlay_image_paths = [None]
@@ -361,42 +863,83 @@ def process_images_batch(
         except IndexError:
             underlay_paths_cleaned.append(None)
 
-    underlay_images = [read_image_as_rgba(img) for img in underlay_image_paths]
+    underlay_images = [read_image_as_rgba(img) for img in underlay_paths_cleaned]
 
     pre_crop_mask = read_image_as_rgba(pre_crop_mask_path) if pre_crop_mask_path else None
     post_paste_mask = read_image_as_rgba(post_paste_mask_path) if post_paste_mask_path else None
 
+    creates_mask = post_paste_mask is None
+
+    # 同じサイズの入力画像（同じUV配置のテクスチャセット）はまとめて再配置する
+    arranged_images, output_mask_image = {}, None
+    if incremental_plan is None:
+        arranged_images, output_mask_image = arrange_texture_sets(input_images, annotation1, annotation2, pre_crop_mask, creates_mask)
+
     # 出力先フォルダを作成
     output_base_dir_path = DEFAULT_OUTPUT_FOLDER
     output_base_dir_path.mkdir(parents=True, exist_ok=True)
     output_dir = create_output_directory(output_base_dir_path, annotation1_path, annotation2_path)
 
-    creates_mask = post_paste_mask is None
-
     # メイン処理のループ
     for i in range(len(input_images)):
         if input_images[i] is None:
             continue
 
+        file_name = determine_file_base_name(input_image_paths[i], annotation2_path)
+        mask_name = determine_mask_name(annotation2_path)
+        underlay_file_name = determine_composite_name(annotation1_path, underlay_paths_cleaned[i]) if underlay_images[i] is not None else None
+
         try:
-            output_images = crop_and_rearrange(
-                input_images[i], annotation1, annotation2,
-                underlay_images[i], pre_crop_mask, post_paste_mask, creates_mask
-            )
+            previous_images = None
+            if incremental_plan is not None:
+                previous_images = read_previous_output_images(
+                    previous_output_dir_path, file_name,
+                    mask_name if creates_mask else None, underlay_file_name
+                )
+                expected_types = {"output"}
+                if creates_mask: expected_types.add("mask")
+                if underlay_file_name: expected_types.add("composite")
+                if not expected_types <= set(previous_images):
+                    logger.warning(f"前回の出力画像が揃っていないため、全ての領域を描き直します: {file_name}")
+                    previous_images = None
+
+            if previous_images is not None:
+                redraw_regions, dirty_rects = incremental_plan
+                output_images = rearrange_incrementally(
+                    previous_images, input_images[i], annotation1, annotation2,
+                    redraw_regions, dirty_rects,
+                    underlay_images[i], pre_crop_mask, post_paste_mask, creates_mask
+                )
+            elif i in arranged_images:
+                output_image, geometry = arranged_images[i]
+                output_images = finish_output_images(
+                    output_image, geometry,
+                    underlay_images[i], post_paste_mask, output_mask_image if creates_mask else None
+                )
+            else:
+                input_size = (input_images[i].shape[1], input_images[i].shape[0])
+                geometry = compile_region_geometry(annotation1, annotation2, input_size)
+                output_images = rearrange_with_geometry(
+                    input_images[i], geometry,
+                    underlay_images[i], pre_crop_mask, post_paste_mask, creates_mask
+                )
         except Exception as e:
             logger.error(f"エラーが発生したため'{input_image_paths[i]}'の処理は中断されました：\n - {e}")
             continue
 
-        file_name = determine_file_base_name(input_image_paths[i], annotation2_path)
         for type, img in output_images.items():
             if type == "output":
-                save_image(img, output_dir / f"{file_name}.png")
+                if sparse:
+                    save_sparse_patches(img, get_patch_rects(geometry), output_dir, file_name)
+                else:
+                    save_image(img, output_dir / f"{file_name}.png")
             elif type == "mask":
-                mask_name = determine_mask_name(annotation2_path)
-                save_image(img, output_dir / f"{mask_name}.png")
+                if sparse:
+                    save_sparse_patches(img, get_patch_rects(geometry), output_dir, mask_name)
+                else:
+                    save_image(img, output_dir / f"{mask_name}.png")
                 creates_mask = False
             elif type == "composite":
-                underlay_file_name = determine_composite_name(annotation1_path, underlay_image_paths[i])
                 save_image(img, output_dir / f"{underlay_file_name}.png")
             else:
                 save_image(img, output_dir / f"{file_name}_{type}.png")
@@ -404,9 +947,321 @@ def process_images_batch(
     if not any(output_dir.iterdir()):
         output_dir.rmdir()
         logger.warning("出力内容が空です。")
+    else:
+        save_render_info(output_dir, annotation1, annotation2)
+
+    logger.info("処理を完了しました。")
+
+def natural_sort_key(path: Path):
+    """
+    ファイル名に含まれる数字を数値として比較するためのキー (frame_2 < frame_10)
+    """
+    return [int(token) if token.isdigit() else token.lower() for token in re.split(r'(\d+)', path.name)]
+
+def list_sequence_frames(sequence_paths):
+    """
+    連番画像のフレームとなる画像ファイルの一覧を返す
+
+    - フォルダの場合：フォルダ内の画像ファイルを番号順に並べる
+    - パターン(例: frames/nail_*.png)の場合：一致する画像ファイルを番号順に並べる
+    - ファイルの場合：そのまま使用する
+    """
+    frames = []
+    for sequence_path in sequence_paths:
+        sequence_path = Path(sequence_path)
+        if sequence_path.is_dir():
+            paths = [p for p in sequence_path.iterdir() if p.suffix.lower() in SEQUENCE_IMAGE_EXTENSIONS]
+            frames.extend(sorted(paths, key=natural_sort_key))
+        elif sequence_path.is_file():
+            frames.append(sequence_path)
+        else:
+            paths = [Path(p) for p in glob.glob(str(sequence_path)) if Path(p).is_file()]
+            if not paths:
+                logger.warning(f"フレームが見つかりません： {sequence_path}")
+            frames.extend(sorted(paths, key=natural_sort_key))
+
+    return frames
+
+def arrange_and_save_frame(frame_path: Path, geometry, output_dir: Path, file_name, mask_name=None, composite_name=None, underlay_image=None, pre_crop_mask=None, post_paste_mask=None, sparse=False):
+    """
+    1フレーム分の読み込み、切り取り・再配置、書き出しを行う
+    複数のスレッドから同時に呼ばれるため、共有する画像は変更しない
+    """
+    image = read_image_as_rgba(frame_path)
+    underlay_image = underlay_image.copy() if underlay_image is not None else None
+
+    output_images = rearrange_with_geometry(
+        image, geometry, underlay_image, pre_crop_mask, post_paste_mask, mask_name is not None
+    )
+
+    for type, img in output_images.items():
+        if type == "output":
+            if sparse:
+                save_sparse_patches(img, get_patch_rects(geometry), output_dir, file_name)
+            else:
+                save_image(img, output_dir / f"{file_name}.png")
+        elif type == "mask":
+            if sparse:
+                save_sparse_patches(img, get_patch_rects(geometry), output_dir, mask_name)
+            else:
+                save_image(img, output_dir / f"{mask_name}.png")
+        elif type == "composite":
+            save_image(img, output_dir / f"{composite_name}.png")
+
+def wait_for_frame(frame_path, future):
+    """
+    フレームの処理の完了を待ち、成功した場合は1を返す
+    """
+    try:
+        future.result()
+        return 1
+    except Exception as e:
+        logger.error(f"エラーが発生したため'{frame_path}'の処理は中断されました：\n - {e}")
+        return 0
+
+def process_frame_sequence(
+    sequence_paths,
+    annotation1_path,
+    annotation2_path,
+    output_base_dir_path=DEFAULT_OUTPUT_FOLDER,
+    underlay_image_path=None,
+    width_override=None,
+    height_override=None,
+    pre_crop_mask_path=None,
+    post_paste_mask_path=None,
+    region_names=None,
+    workers=None,
+    sparse=False
+):
+    """
+    連番画像の各フレームを、同じ領域の変換で切り取り・再配置する
+
+    変換はアノテーションから1回だけ計算し、全フレームで使い回す
+    読み込み・再配置・書き出しはフレームごとに複数のスレッドで並列に処理する
+    同時に処理するフレーム数を制限しているため、フレーム数が増えてもメモリ使用量は一定
+    """
+    annotation1_path = Path(annotation1_path)
+    annotation2_path = Path(annotation2_path)
+    underlay_image_path = Path(underlay_image_path) if underlay_image_path else None
+    width_override = int(width_override) if width_override else None
+    height_override = int(height_override) if height_override else None
+    workers = int(workers) if workers else (os.cpu_count() or 1)
+
+    frames = list_sequence_frames(sequence_paths)
+    if not frames:
+        raise ValueError("入力画像が空です。フレームが見つかりませんでした。")
+
+    annotation1 = load_json_file(annotation1_path)
+    annotation2 = load_json_file(annotation2_path)
+
+    if width_override:
+        annotation2['canvas']['width'] = width_override
+    if height_override:
+        annotation2['canvas']['height'] = height_override
+
+    if region_names:
+        region_names = set(region_names)
+        annotation2['regions'] = {name: region for name, region in annotation2['regions'].items() if name in region_names}
+
+    # 領域の変換は最初のフレームのサイズで1回だけ計算する
+    first_frame = read_image_as_rgba(frames[0])
+    geometry = compile_region_geometry(annotation1, annotation2, (first_frame.shape[1], first_frame.shape[0]))
+    del first_frame
+
+    underlay_image = read_image_as_rgba(underlay_image_path) if underlay_image_path else None
+    pre_crop_mask = read_image_as_rgba(pre_crop_mask_path) if pre_crop_mask_path else None
+    post_paste_mask = read_image_as_rgba(post_paste_mask_path) if post_paste_mask_path else None
+
+    # 出力先フォルダを作成
+    output_base_dir_path = Path(output_base_dir_path)
+    output_base_dir_path.mkdir(parents=True, exist_ok=True)
+    output_dir = create_output_directory(output_base_dir_path, annotation1_path, annotation2_path)
+
+    # マスク画像は入力画像に依存しないため、最初のフレームでのみ作成する
+    mask_name = determine_mask_name(annotation2_path) if post_paste_mask is None else None
+    composite_name = determine_composite_name(annotation1_path, underlay_image_path) if underlay_image_path else None
+
+    logger.info(f"{len(frames)}フレームを{workers}スレッドで処理します。")
+    start_time = time.perf_counter()
+    processed_count = 0
+
+    # 同時に処理するフレーム数をスレッド数の2倍までに制限する
+    max_pending = workers * 2
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for i, frame_path in enumerate(frames):
+            if len(pending) >= max_pending:
+                processed_count += wait_for_frame(*pending.popleft())
+
+            future = executor.submit(
+                arrange_and_save_frame,
+                frame_path, geometry, output_dir,
+                determine_file_base_name(frame_path, annotation2_path),
+                mask_name if i == 0 else None,
+                f"{composite_name}_{frame_path.stem}" if composite_name else None,
+                underlay_image, pre_crop_mask, post_paste_mask, sparse
+            )
+            pending.append((frame_path, future))
+
+        while pending:
+            processed_count += wait_for_frame(*pending.popleft())
+
+    elapsed = time.perf_counter() - start_time
+
+    if not any(output_dir.iterdir()):
+        output_dir.rmdir()
+        logger.warning("出力内容が空です。")
+    else:
+        save_render_info(output_dir, annotation1, annotation2)
 
+    fps = processed_count / elapsed if elapsed > 0 else 0.0
+    logger.info(f"{processed_count}/{len(frames)}フレームを{elapsed:.2f}秒で処理しました。({fps:.2f} fps)")
     logger.info("処理を完了しました。")
 
+def get_region_outline(matrix, size):
+    """
+    領域の画像の座標から表示先の座標への変換を使って、領域の四隅と向き（"上"方向）を示す矢印の始点・終点を返す
+    """
+    w, h = size
+    corners = np.array([[-0.5, -0.5], [w - 0.5, -0.5], [w - 0.5, h - 0.5], [-0.5, h - 0.5]])
+    arrow = np.array([[(w - 1) / 2, (h - 1) / 2], [(w - 1) / 2, -0.5]])
+
+    corners = corners @ matrix[:, :2].T + matrix[:, 2]
+    arrow = arrow @ matrix[:, :2].T + matrix[:, 2]
+
+    return corners, arrow
+
+def draw_region_outline(image, corners, arrow, name, color):
+    """
+    領域の外形、向きを示す矢印、領域名を描画する
+    """
+    cv2.polylines(image, [np.round(corners).astype(np.int32)], True, color, 1, cv2.LINE_AA)
+
+    start, end = [tuple(int(round(v)) for v in point) for point in arrow]
+    cv2.arrowedLine(image, start, end, color, 1, cv2.LINE_AA, tipLength=0.3)
+
+    # 領域名が画像の外にはみ出さないよう位置を調整する
+    (text_width, text_height), _ = cv2.getTextSize(name, cv2.FONT_HERSHEY_SIMPLEX, 0.35, 1)
+    text_x = min(max(start[0], 0), max(image.shape[1] - text_width, 0))
+    text_y = min(max(start[1], text_height), image.shape[0] - 1)
+    cv2.putText(image, name, (text_x, text_y), cv2.FONT_HERSHEY_SIMPLEX, 0.35, color, 1, cv2.LINE_AA)
+
+def get_region_colors(region_names):
+    """
+    切り取り元と貼り付け先の対応がわかるよう、領域ごとに色相の異なる色を返す
+    """
+    colors = {}
+    for i, region_name in enumerate(region_names):
+        hsv = np.array([[[int(180 * i / max(len(region_names), 1)), 255, 255]]], dtype=np.uint8)
+        b, g, r = cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR)[0, 0]
+        colors[region_name] = (int(b), int(g), int(r), 255)
+    return colors
+
+def render_preview(input_image, annotation1, annotation2, underlay_image=None, pre_crop_mask=None, post_paste_mask=None):
+    """
+    切り取り元（左）と貼り付け先（右）を並べ、領域の外形・向き・名前を描画したプレビュー画像を作成する
+    貼り付け先は本番の出力と同じ処理（compile_region_geometry, arrange_regions, finish_output_images）で作成する
+    """
+    input_size = (input_image.shape[1], input_image.shape[0])
+    geometry = compile_region_geometry(annotation1, annotation2, input_size)
+    output_size = geometry["output_size"]
+
+    source_image = apply_mask(input_image, pre_crop_mask) if pre_crop_mask is not None else input_image
+    output_images, _ = arrange_regions([source_image], geometry)
+    output_image = output_images[0]
+
+    if underlay_image is None:
+        underlay_image = np.full((output_size[1], output_size[0], 4), PREVIEW_BACKGROUND_COLOR, dtype=np.uint8)
+
+    # 全ての領域が透明な場合も、配置の確認のために外形は描画する
+    if np.sum(output_image) == 0:
+        logger.warning("出力画像が透明です。領域の配置を確認してください。")
+        destination_image = underlay_image
+    else:
+        destination_image = finish_output_images(output_image, geometry, underlay_image, post_paste_mask)["composite"]
+
+    # 切り取り元の画像も背景色の上に合成する
+    background = np.full((input_size[1], input_size[0], 4), PREVIEW_BACKGROUND_COLOR, dtype=np.uint8)
+    source_image = composite_onto_underlay(background, source_image, (0, 0, input_size[0], input_size[1]))
+
+    # 貼り付け先の座標は、下に敷く画像の解像度に合わせる
+    destination_scale = np.array([destination_image.shape[1] / output_size[0], destination_image.shape[0] / output_size[1]])
+
+    colors = get_region_colors(list(geometry["regions"]))
+    for region_name, region in geometry["regions"].items():
+        crop_matrix = cv2.invertAffineTransform(region["crop_matrix"])
+        corners, arrow = get_region_outline(crop_matrix, region["crop_size"])
+        draw_region_outline(source_image, corners, arrow, region_name, colors[region_name])
+
+        paste_matrix = region["paste_matrix"].copy()
+        paste_matrix[:, 2] += region["dest_rect"][:2]
+        corners, arrow = get_region_outline(paste_matrix, region["paste_size"])
+        draw_region_outline(destination_image, corners * destination_scale, arrow * destination_scale, region_name, colors[region_name])
+
+    # 切り取り元を貼り付け先と同じ高さにして横に並べる
+    source_height = destination_image.shape[0]
+    source_width = max(int(round(source_image.shape[1] * source_height / source_image.shape[0])), 1)
+    source_image = cv2.resize(source_image, (source_width, source_height), interpolation=cv2.INTER_AREA)
+
+    return cv2.hconcat([source_image, destination_image])
+
+def process_preview(
+    input_image_path,
+    annotation1_path,
+    annotation2_path,
+    output_base_dir_path=DEFAULT_OUTPUT_FOLDER,
+    underlay_image_path=None,
+    width_override=None,
+    height_override=None,
+    pre_crop_mask_path=None,
+    post_paste_mask_path=None,
+    region_names=None,
+    scale=DEFAULT_PREVIEW_SCALE
+):
+    """
+    縮小した解像度で切り取り・再配置を行い、領域の配置を確認するためのプレビュー画像を出力する
+    出力先は毎回同じファイル（上書き）
+    """
+    start_time = time.perf_counter()
+
+    input_image_path = Path(input_image_path)
+    annotation1_path = Path(annotation1_path)
+    annotation2_path = Path(annotation2_path)
+    scale = float(scale)
+
+    if not 0 < scale <= 1:
+        raise ValueError(f"プレビューの縮小率は0より大きく1以下である必要があります： {scale}")
+
+    annotation1 = load_json_file(annotation1_path)
+    annotation2 = load_json_file(annotation2_path)
+
+    if width_override:
+        annotation2['canvas']['width'] = int(width_override)
+    if height_override:
+        annotation2['canvas']['height'] = int(height_override)
+
+    if region_names:
+        region_names = set(region_names)
+        annotation2['regions'] = {name: region for name, region in annotation2['regions'].items() if name in region_names}
+
+    input_image = read_image_as_rgba_reduced(input_image_path, scale)
+    underlay_image = read_image_as_rgba_reduced(underlay_image_path, scale) if underlay_image_path else None
+    pre_crop_mask = read_image_as_rgba_reduced(pre_crop_mask_path, scale) if pre_crop_mask_path else None
+    post_paste_mask = read_image_as_rgba_reduced(post_paste_mask_path, scale) if post_paste_mask_path else None
+
+    # 貼り付け先のキャンバスを縮小し、絶対座標の場合は切り取り元の座標も縮小後の入力画像に合わせる
+    annotation2 = scale_annotation(annotation2, scale, scale)
+    if annotation1['canvas']['coordinate_system'] == "absolute":
+        annotation1 = scale_annotation(annotation1, scale, scale)
+
+    preview_image = render_preview(input_image, annotation1, annotation2, underlay_image, pre_crop_mask, post_paste_mask)
+
+    output_dir = Path(output_base_dir_path) / "preview"
+    output_dir.mkdir(parents=True, exist_ok=True)
+    save_image(preview_image, output_dir / f"{annotation1_path.stem}_to_{annotation2_path.stem}_preview.png")
+
+    logger.info(f"プレビューを{time.perf_counter() - start_time:.2f}秒で作成しました。")
+
 def main():
     parser = argparse.ArgumentParser(
         description='画像とアノテーションファイルから複数の矩形領域を切り取り再配置するスクリプトです。',
@@ -422,10 +1277,58 @@ def main():
     parser.add_argument('-h', '--height', help='出力画像の高さ。省略した場合annotation2のキャンバスサイズを使用します。')
     parser.add_argument('-m1', '--pre-crop-mask', help='切り取り領域を詳細指定するためのマスク画像')
     parser.add_argument('-m2', '--post-paste-mask', help='貼り付け領域を詳細指定するためのマスク画像')
+    parser.add_argument('-r', '--regions', nargs='+', help='処理する領域名。省略した場合は全ての領域を処理します。')
+    parser.add_argument('-i', '--incremental', help='前回の出力フォルダ。前回から変更された領域だけを描き直して出力します。')
+    parser.add_argument('-s', '--sequence', action='store_true', help='input_imageを連番画像(フォルダまたは"frames/nail_*.png"のようなパターン)として扱い、全フレームを同じ配置で処理します。')
+    parser.add_argument('-p', '--sparse', action='store_true', help='出力画像とマスク画像を、キャンバス全体ではなく貼り付けた領域だけをまとめたアトラス画像と位置情報のJSONファイルで出力します。')
+    parser.add_argument('-pv', '--preview', action='store_true', help='縮小した解像度で処理し、領域の配置を確認するためのプレビュー画像をoutputs/preview/に出力します。')
+    parser.add_argument('-ps', '--preview-scale', type=float, default=DEFAULT_PREVIEW_SCALE, help=f'プレビューの縮小率。省略した場合は{DEFAULT_PREVIEW_SCALE}です。')
+    parser.add_argument('-j', '--workers', help='--sequence指定時に並列で処理するスレッド数。省略した場合はCPUのコア数を使用します。')
 
     args = parser.parse_args()
 
     try:
+        if args.preview:
+            if len(args.input_image) > 1:
+                logger.warning("preview指定時は最初のinput_imageのみを処理します。")
+
+            process_preview(
+                args.input_image[0],
+                args.annotation1,
+                args.annotation2,
+                DEFAULT_OUTPUT_FOLDER,
+                args.underlay_image[0] if args.underlay_image else None,
+                args.width,
+                args.height,
+                args.pre_crop_mask,
+                args.post_paste_mask,
+                args.regions,
+                args.preview_scale
+            )
+            return
+
+        if args.sequence:
+            if args.incremental:
+                raise ValueError("sequenceとincrementalは同時に指定できません。")
+            if args.underlay_image and len(args.underlay_image) > 1:
+                logger.warning("sequence指定時は最初のunderlay_imageのみを全フレームに使用します。")
+
+            process_frame_sequence(
+                args.input_image,
+                args.annotation1,
+                args.annotation2,
+                DEFAULT_OUTPUT_FOLDER,
+                args.underlay_image[0] if args.underlay_image else None,
+                args.width,
+                args.height,
+                args.pre_crop_mask,
+                args.post_paste_mask,
+                args.regions,
+                args.workers,
+                args.sparse
+            )
+            return
+
         process_images_batch(
             args.input_image,
             args.annotation1,
@@ -435,7 +1338,10 @@ def main():
             args.width,
             args.height,
             args.pre_crop_mask,
-            args.post_paste_mask
+            args.post_paste_mask,
+            args.regions,
+            args.incremental,
+            args.sparse
         )
     except Exception as e:
         logger.critical(f"{e}")
@@ -0,0 +1,52 @@
+import sys
+import argparse
+import logging
+from pathlib import Path
+
+from arrange_images import DEFAULT_OUTPUT_FOLDER, load_json_file, create_annotation_mask, determine_mask_name, save_image
+
+
+logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='貼り付け側のアノテーションファイルだけから、貼り付け領域のマスク画像を作成するスクリプトです。入力画像は不要です。',
+        add_help=False
+    )
+
+    parser.add_argument('--help', action='help', help='このヘルプメッセージを表示')
+    parser.add_argument('annotation', nargs='+', help='貼り付け箇所を指定するアノテーションファイル。複数指定した場合はそれぞれのマスク画像を作成します。')
+    parser.add_argument('-w', '--width', help='マスク画像の幅。省略した場合アノテーションのキャンバスサイズを使用します。')
+    parser.add_argument('-h', '--height', help='マスク画像の高さ。省略した場合アノテーションのキャンバスサイズを使用します。')
+    parser.add_argument('-o', '--output-path', help='出力先フォルダ')
+    parser.add_argument('--no-antialias', action='store_true', help='領域の境界をアンチエイリアスせず、0か255の2値で出力します。')
+
+    args = parser.parse_args()
+
+    output_dir = Path(args.output_path) if args.output_path else DEFAULT_OUTPUT_FOLDER
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    failed = False
+    for annotation_path in [Path(p) for p in args.annotation]:
+        try:
+            annotation = load_json_file(annotation_path)
+            if args.width:
+                annotation['canvas']['width'] = int(args.width)
+            if args.height:
+                annotation['canvas']['height'] = int(args.height)
+
+            mask_image = create_annotation_mask(annotation, not args.no_antialias)
+        except Exception as e:
+            logger.error(f"エラーが発生したため'{annotation_path}'の処理は中断されました：\n - {e}")
+            failed = True
+            continue
+
+        save_image(mask_image, output_dir / f"{determine_mask_name(annotation_path)}.png")
+
+    if failed:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()